@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from ._modulecmd import (
     Modulecmd, ModulecmdException,
+    ModuleProfile, ModuleProfileReport,
     ModulecmdRuntimeError, ModulecmdMissingSetup
     )
 
@@ -9,5 +10,7 @@ __all__ = [
     'Modulecmd',
     'ModulecmdException',
     'ModulecmdRuntimeError',
-    'ModulecmdMissingSetup'
+    'ModulecmdMissingSetup',
+    'ModuleProfile',
+    'ModuleProfileReport'
 ]
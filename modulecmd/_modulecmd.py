@@ -20,10 +20,13 @@
                 m.switch("mod3","mod3/dev")
                 m.list() # shows currently loaded modules
                 m.purge() # unloads everything
+                # measure what loading each module costs
+                print(m.profile(["mymod", "mod2"]))
 """
 
 import os
 import sys
+import time
 import traceback
 
 class ModulecmdException(Exception, object):
@@ -56,6 +59,129 @@ class ModulecmdMissingSetup(ModulecmdException, object):
     def __init__(self, message=None):
         super(ModulecmdMissingSetup, self).__init__(message)
 
+class ModuleProfile(object):
+    """
+	Cost of loading a single module, as measured by
+	Modulecmd.profile.  Modules that were pulled in
+	by loading this one are kept under children.
+	overhead is the cost of loading it again once it is
+	already loaded, which is what a modulecmd load costs
+	before any modulefile runs.  inherited is set for
+	modules that could not be loaded on their own and
+	whose cost is left in their parent
+    """
+
+    def __init__(self, name, loaded=None, loaded_ok=True):
+        self.name = name
+        self.loaded = loaded or name
+        self.loaded_ok = loaded_ok
+        self.inherited = False
+        self.overhead = 0.0
+        self.wall_time = 0.0
+        self.subprocess_time = 0.0
+        self.output_size = 0
+        self.variables = []
+        self.children = []
+
+    @property
+    def self_time(self):
+        """
+            estimate of the wall time spent in this module itself.
+            Each child is timed in its own modulecmd call, so the
+            overhead of a call is taken off the parent and each
+            direct child before the children are subtracted
+        """
+        child_time = sum([
+            max(child.wall_time - child.overhead, 0.0)
+            for child in self.children
+        ])
+        return max(self.wall_time - self.overhead - child_time, 0.0)
+
+    def tree(self):
+        """
+            Returns a nested dict of this module and its children
+        """
+        return {
+            'name': self.loaded,
+            'loaded_ok': self.loaded_ok,
+            'inherited': self.inherited,
+            'wall_time': self.wall_time,
+            'self_time': self.self_time,
+            'subprocess_time': self.subprocess_time,
+            'output_size': self.output_size,
+            'variables': list(self.variables),
+            'children': [child.tree() for child in self.children],
+        }
+
+    def flame(self, depth=0):
+        """
+            Returns a list of indented lines, one per module, with
+            dependent modules nested under the module that loaded them
+        """
+        if self.inherited:
+            status = " (inherited)"
+        elif not self.loaded_ok:
+            status = " FAILED"
+        else:
+            status = ""
+        lines = ["%s%s %.3fs (self %.3fs)%s" % (
+            "  " * depth, self.loaded, self.wall_time, self.self_time, status)]
+        for child in self.children:
+            lines.extend(child.flame(depth + 1))
+        return lines
+
+    def __repr__(self):
+        return "ModuleProfile(%r, wall_time=%.3f)" % (self.loaded, self.wall_time)
+
+class ModuleProfileReport(object):
+    """
+	Result of Modulecmd.profile.  isolated holds one
+	ModuleProfile per module loaded into a clean copy of
+	the environment, sequence holds the cost of each module
+	when loaded one after another in the order given
+    """
+
+    columns = ('wall_time', 'subprocess_time', 'output_size', 'variables')
+
+    def __init__(self, isolated=None, sequence=None):
+        self.isolated = isolated or []
+        self.sequence = sequence or []
+
+    def sort(self, key='wall_time', reverse=True, sequence=False):
+        """
+            Usage:
+                    report.sort()
+                    report.sort('output_size', sequence=True)
+            Returns:
+                    list of ModuleProfile, most expensive first by default
+
+            key can be any ModuleProfile attribute.  'variables' sorts
+            by the number of variables touched
+        """
+        profiles = self.sequence if sequence else self.isolated
+        if key == 'variables':
+            return sorted(profiles, key=lambda prof: len(prof.variables), reverse=reverse)
+        return sorted(profiles, key=lambda prof: getattr(prof, key), reverse=reverse)
+
+    def flame(self):
+        """
+            Returns the nested breakdown of the isolated loads as text
+        """
+        lines = []
+        for prof in self.sort():
+            lines.extend(prof.flame())
+        return "\n".join(lines)
+
+    def __str__(self):
+        lines = ["%-40s %10s %10s %10s %5s %6s" % (
+            'module', 'wall(s)', 'subproc(s)', 'output', 'vars', 'status')]
+        for prof in self.sort():
+            lines.append("%-40s %10.3f %10.3f %10d %5d %6s" % (
+                prof.loaded, prof.wall_time, prof.subprocess_time,
+                prof.output_size, len(prof.variables),
+                "ok" if prof.loaded_ok else "FAILED"))
+        return "\n".join(lines)
+
 class Modulecmd:
     """
 	class that implements most of the functionality
@@ -89,6 +215,8 @@ class Modulecmd:
         """
         self.verbose = verbose
         self.last_error = ''
+        self._subprocess_time = 0.0
+        self._output_size = 0
         if modulecmd:
             self.modulecmd = modulecmd
         else:
@@ -241,6 +369,139 @@ class Modulecmd:
         for envmod in mods:
             self._modulecmd("""%s python load %s""" % (self.modulecmd, envmod))
 
+    def profile(self, mods):
+        """
+            Usage:
+                    m.profile(<module>)
+                    m.profile([<mod1>, <mod2>, etc.])
+            Returns:
+                    ModuleProfileReport
+
+            Measures the cost of loading each module: wall time, time
+            spent in modulecmd, size of its output and the environment
+            variables it touches.  Each module is loaded once on its own
+            and once in sequence with the others.  Modules loaded as a
+            side effect are profiled on their own and nested under the
+            module that pulled them in.  Each child is loaded into the
+            environment its parent produced, with the child itself
+            unloaded again.  Children that still fail on their own are
+            marked inherited and their cost stays with the parent.
+            Modules that did not end up in $LOADEDMODULES are marked
+            with loaded_ok=False.  The environment is restored when done.
+
+            The nesting is rebuilt from $LOADEDMODULES, which does not
+            record who loaded what.  A dependency shared by several
+            modules is nested under the last sibling that needs it, even
+            if the parent loaded it directly.
+
+            self_time is an estimate: each module is loaded a second
+            time once it is loaded, which costs as much as a modulecmd
+            load that runs no modulefile.  That overhead is taken off
+            each module so that children timed in their own call are
+            not charged to the parent twice.
+        """
+        if isinstance(mods, str):
+            tmpmod = mods
+            mods = [tmpmod, ]
+        start_env = dict(os.environ)
+        report = ModuleProfileReport()
+        try:
+            for envmod in mods:
+                report.isolated.append(self._profile_isolated(
+                    envmod, start_env, start_env, set()))
+            self._restore_environ(start_env)
+            for envmod in mods:
+                report.sequence.append(self._profile_load(envmod)[0])
+        finally:
+            self._restore_environ(start_env)
+        return report
+
+    def _profile_isolated(self, mod, load_env, start_env, parents):
+        self._restore_environ(load_env)
+        prof, new_mods = self._profile_load(mod)
+        parent_env = dict(os.environ)
+        parents = parents | set([prof.loaded])
+        covered = set()
+        # a dependency lands in $LOADEDMODULES before the module that
+        # loaded it, so walking backwards meets each direct child before
+        # anything in its subtree
+        for child in reversed(new_mods):
+            if child in covered or child in parents:
+                continue
+            child_env = self._profile_child_env(child, parent_env, start_env)
+            child_prof = self._profile_isolated(
+                child, child_env, start_env, parents)
+            if not child_prof.loaded_ok:
+                child_prof = ModuleProfile(child, child)
+                child_prof.inherited = True
+            covered.update(self._profile_subtree(child_prof))
+            prof.children.insert(0, child_prof)
+        return prof
+
+    def _profile_child_env(self, child, parent_env, start_env):
+        # the environment the parent produced, minus the child's subtree
+        self._restore_environ(parent_env)
+        self._modulecmd("%s python unload --force %s" % (self.modulecmd, child))
+        if child not in self.list():
+            return dict(os.environ)
+        # modulecmd would not unload it, start clean with the parent's paths
+        child_env = dict(start_env)
+        child_env.pop('MODULEPATH', None)
+        if 'MODULEPATH' in parent_env:
+            child_env['MODULEPATH'] = parent_env['MODULEPATH']
+        return child_env
+
+    def _profile_subtree(self, prof):
+        names = set([prof.name, prof.loaded])
+        for child in prof.children:
+            names.update(self._profile_subtree(child))
+        return names
+
+    def _profile_load(self, mod):
+        before_env = dict(os.environ)
+        before_mods = self.list()
+        before_error = self.last_error
+        start_subprocess = self._subprocess_time
+        start_output = self._output_size
+        start = time.time()
+        self.load(mod)
+        wall_time = time.time() - start
+        after_mods = self.list()
+        new_mods = [x for x in after_mods if x and x not in before_mods]
+        loaded = None
+        for newmod in new_mods + after_mods:
+            if newmod == mod or newmod.startswith(mod + "/"):
+                loaded = newmod
+                break
+        loaded_ok = loaded is not None and self.last_error == before_error
+        prof = ModuleProfile(mod, loaded, loaded_ok)
+        prof.wall_time = wall_time
+        prof.subprocess_time = self._subprocess_time - start_subprocess
+        prof.output_size = self._output_size - start_output
+        prof.variables = sorted([
+            x for x in set(before_env) | set(os.environ)
+            if before_env.get(x) != os.environ.get(x)
+        ])
+        if loaded_ok:
+            # loading it again runs no modulefile, only modulecmd itself
+            start = time.time()
+            self.load(prof.loaded)
+            prof.overhead = time.time() - start
+        if self.verbose:
+            if loaded_ok:
+                print("Loaded %s in %.3fs" % (prof.loaded, wall_time))
+            else:
+                print("Failed to load %s" % mod)
+        return prof, [x for x in new_mods if x != prof.loaded]
+
+    def _restore_environ(self, env):
+        for key in list(os.environ.keys()):
+            if key not in env:
+                del os.environ[key]
+        for key, value in env.items():
+            if os.environ.get(key) != value:
+                os.environ[key] = value
+
     def add(self, *args, **kwargs):
         """
             Alias to m.load method
@@ -294,11 +555,12 @@ class Modulecmd:
         """
         return self.show(*args, **kwargs)
 
-    def _runsystem(self, cmd):
+    def _runsystem(self, cmd, merge_stderr=True):
         """
 	Internal function that runs a system command and returns
 	the output.  It tries to use subprocess module first
-	and falls back to os.popen if it can't
+	and falls back to os.popen if it can't.  With
+	merge_stderr=False stderr is left on the terminal
         """
         try:
             import subprocess
@@ -307,7 +569,7 @@ class Modulecmd:
         try:
             pout = subprocess.check_output(
                 cmd,
-                stderr=subprocess.STDOUT,
+                stderr=subprocess.STDOUT if merge_stderr else None,
                 shell=True)
         except subprocess.CalledProcessError as called_err:
             raise ModulecmdRuntimeError(str(called_err))
@@ -388,12 +650,16 @@ class Modulecmd:
                 sys.stderr.write("Invalid module command:\n%s\n" % cmd)
             cmdtype = None
 
+        start = time.time()
         try:
-            out = self._runsystem(cmd)
+            # messages on stderr (e.g. "Loading requirement") would break exec
+            out = self._runsystem(cmd, merge_stderr=cmdtype in noout_cmds)
         except Exception:
             if self.verbose:
                 traceback.print_exc()
+        self._subprocess_time += time.time() - start
         if out:
+            self._output_size += len(out)
             if cmdtype not in noout_cmds:
                 if self.verbose:
                     print("Calling eval on %s" % out)
@@ -150,6 +150,112 @@ set ModulesVersion "1"'''
                 "Envrionment version is wrong with switch to %s" % nextmod
             )
 
+    def test_profile(self):
+        env_before = dict(os.environ)
+        report = self.mobj.profile(self.modules)
+        self.assertEqual(len(report.isolated), len(self.modules))
+        self.assertEqual(len(report.sequence), len(self.modules))
+        for prof in report.isolated:
+            self.assertTrue(prof.wall_time >= prof.subprocess_time)
+            self.assertTrue(prof.output_size > 0)
+            self.assertTrue(
+                '__TEST_MODULECMD_VERSION__' in prof.variables,
+                "%s did not report touching its variables" % prof.name
+            )
+        walls = [x.wall_time for x in report.sort()]
+        self.assertEqual(walls, sorted(walls, reverse=True))
+        self.assertEqual(
+            env_before,
+            dict(os.environ),
+            "profile did not restore the environment"
+        )
+
+    def test_profile_nested(self):
+        parent_dir = os.path.join(self.module_dir, "mcmdparent")
+        os.makedirs(parent_dir)
+        with open(os.path.join(parent_dir, "1"), "w") as pfh:
+            pfh.write("""#%%Module1.0
+module load %s
+setenv __TEST_MODULECMD_PARENT__ {parent}""" % self.modules[1])
+        report = self.mobj.profile("mcmdparent/1")
+        prof = report.isolated[0]
+        self.assertEqual(prof.loaded, "mcmdparent/1")
+        self.assertEqual(
+            [x.loaded for x in prof.children],
+            [self.modules[1]],
+            "dependent module missing from %s" % str(prof.tree())
+        )
+        self.assertTrue(prof.self_time <= prof.wall_time)
+        self.assertTrue(self.modules[1] in report.flame())
+
+    def test_profile_chain(self):
+        # mcmdparent/1 -> (mcmdchild/1 -> mcmdtest/2, mcmdsib1/1 .. mcmdsib4/1),
+        # where mcmdchild is only reachable through the module use done by
+        # mcmdparent and reads a variable mcmdparent sets before loading it
+        hier_dir = os.path.join(self.module_dir, "hier")
+        child_dir = os.path.join(hier_dir, "mcmdchild")
+        parent_dir = os.path.join(self.module_dir, "mcmdparent")
+        sibs = ["mcmdsib%d/1" % x for x in range(1, 5)]
+        for tmpdir in [child_dir, parent_dir]:
+            os.makedirs(tmpdir)
+        with open(os.path.join(child_dir, "1"), "w") as cfh:
+            cfh.write("""#%%Module1.0
+module load %s
+setenv __TEST_MODULECMD_CHILD__ $env(__TEST_MODULECMD_PARENT__)""" % self.modules[1])
+        for sib in sibs:
+            os.makedirs(os.path.join(self.module_dir, os.path.dirname(sib)))
+            with open(os.path.join(self.module_dir, sib), "w") as sfh:
+                sfh.write("""#%Module1.0
+setenv __TEST_MODULECMD_SIB__ {sib}""")
+        with open(os.path.join(parent_dir, "1"), "w") as pfh:
+            pfh.write("""#%%Module1.0
+module use %s
+after 50
+setenv __TEST_MODULECMD_PARENT__ {parent}
+module load mcmdchild/1
+module load %s""" % (hier_dir, " ".join(sibs)))
+        report = self.mobj.profile("mcmdparent/1")
+        prof = report.isolated[0]
+        self.assertTrue(prof.loaded_ok)
+        self.assertEqual(
+            [x.loaded for x in prof.children],
+            ["mcmdchild/1"] + sibs,
+            "wrong direct children in %s" % str(prof.tree())
+        )
+        child = prof.children[0]
+        self.assertTrue(child.loaded_ok, "mcmdchild/1 did not load in its parent's environment")
+        self.assertFalse(child.inherited)
+        self.assertTrue('__TEST_MODULECMD_CHILD__' in child.variables)
+        self.assertEqual([x.loaded for x in child.children], [self.modules[1]])
+        self.assertTrue(child.children[0].loaded_ok)
+        self.assertTrue(prof.overhead > 0)
+        # each child paid for its own modulecmd call; charging those to
+        # mcmdparent would swallow its 50ms of own work
+        self.assertTrue(
+            prof.self_time > 0.02,
+            "self time of mcmdparent/1 lost in %s" % str(prof.tree())
+        )
+        self.assertTrue(prof.self_time <= prof.wall_time)
+        self.assertEqual(
+            [x.loaded for x in report.sequence],
+            ["mcmdparent/1"]
+        )
+        seq = report.sequence[0]
+        self.assertTrue(seq.loaded_ok)
+        for envvar in ['__TEST_MODULECMD_PARENT__', '__TEST_MODULECMD_CHILD__',
+                       '__TEST_MODULECMD_SIB__', '__TEST_MODULECMD_VERSION__']:
+            self.assertTrue(
+                envvar in seq.variables,
+                "%s missing from sequence variables %s" % (envvar, str(seq.variables))
+            )
+
+    def test_profile_failed(self):
+        report = self.mobj.profile([self.modules[0], "mcmdtest/does_not_exist"])
+        status = dict([(x.name, x.loaded_ok) for x in report.isolated])
+        self.assertEqual(status[self.modules[0]], True)
+        self.assertEqual(status["mcmdtest/does_not_exist"], False)
+        self.assertTrue("FAILED" in str(report))
+
     def test_load_unload(self):
         import random
         import re